@@ -57,17 +57,9 @@ def main():
         """)
         con.executemany(
             "INSERT OR REPLACE INTO road_summary VALUES(?,?,?,?,?,?)",
-            [
-                (
-                    int(r.road_id),
-                    float(r.n_crashes),
-                    float(r.sev_sum),
-                    float(r.crashes_per_km),
-                    float(r.sev_per_km),
-                    float(r.risk_score),
-                )
-                for _, r in summary.iterrows()
-            ],
+            summary[
+                ["road_id", "n_crashes", "sev_sum", "crashes_per_km", "sev_per_km", "risk_score"]
+            ].itertuples(index=False, name=None),
         )
 
     print("Pipeline complete:")
@@ -5,6 +5,8 @@ from dataclasses import dataclass
 
 import geopandas as gpd
 import numpy as np
+import pandas as pd
+import shapely
 from shapely.geometry import LineString
 
 
@@ -14,37 +16,51 @@ class AnalysisConfig:
 
 
 def nearest_road(crashes: gpd.GeoDataFrame, roads: gpd.GeoDataFrame, cfg: AnalysisConfig) -> gpd.GeoDataFrame:
-    # Use robust nearest-neighbor join with optional search radius
-    joined = gpd.sjoin_nearest(
-        crashes,
-        roads[["road_id", "geometry"]],
-        how="left",
+    # Nearest-neighbor search with optional search radius, run entirely in GEOS.
+    # Ties resolve to a single road so a crash is never counted twice.
+    tree = shapely.STRtree(roads.geometry.values)
+    (idx_crash, idx_road), dist = tree.query_nearest(
+        crashes.geometry.values,
         max_distance=cfg.search_radius,
-        distance_col="dist_m",
+        return_distance=True,
+        all_matches=False,
     )
 
-    # Rename columns from right frame to avoid suffixes
-    # After sjoin_nearest with crashes as left, 'road_id' comes from right
-    out = joined[["crash_id", "severity", "hour", "geometry", "road_id", "dist_m"]].copy()
+    # Left-join semantics: crashes without a road in range keep NaN
+    road_id = np.full(len(crashes), np.nan)
+    road_id[idx_crash] = roads["road_id"].to_numpy()[idx_road]
+    dist_m = np.full(len(crashes), np.nan)
+    dist_m[idx_crash] = dist
+
+    out = crashes[["crash_id", "severity", "hour", "geometry"]].copy()
+    out["road_id"] = road_id
+    out["dist_m"] = dist_m
     return out
 
 
 def road_summary(roads: gpd.GeoDataFrame, crash_assignments: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    # Aggregate crashes per road
-    grp = crash_assignments.dropna(subset=["road_id"]).groupby("road_id")
-    agg = grp.agg(n_crashes=("crash_id", "count"),
-                  sev_sum=("severity", "sum"))
-
-    summary = roads.merge(agg, on="road_id", how="left")
-    summary["n_crashes"] = summary["n_crashes"].fillna(0)
-    summary["sev_sum"] = summary["sev_sum"].fillna(0)
-
-    # Simple risk score scaled by length
-    summary["crashes_per_km"] = (summary["n_crashes"] / (summary["length_m"] / 1000)).replace([np.inf, -np.inf], 0)
-    summary["sev_per_km"] = (summary["sev_sum"] / (summary["length_m"] / 1000)).replace([np.inf, -np.inf], 0)
-    summary["risk_score"] = 0.6 * summary["sev_per_km"] + 0.4 * summary["crashes_per_km"]
+    # Aggregate crashes per road with bincount over each crash's road position;
+    # unassigned crashes (NaN road_id) map to -1 and are dropped
+    road_pos = pd.Index(roads["road_id"].to_numpy(dtype=float)).get_indexer(
+        crash_assignments["road_id"].to_numpy(dtype=float)
+    )
+    matched = road_pos >= 0
+    road_pos = road_pos[matched]
+    sev = crash_assignments["severity"].to_numpy(dtype=float)[matched]
+    n_crashes = np.bincount(road_pos, minlength=len(roads)).astype(float)
+    sev_sum = np.bincount(road_pos, weights=sev, minlength=len(roads))
 
-    return summary
+    # Simple risk score scaled by length; zero-length roads score 0
+    length_km = roads["length_m"].to_numpy(dtype=float) / 1000.0
+    crashes_per_km = np.divide(n_crashes, length_km, out=np.zeros_like(n_crashes), where=length_km > 0)
+    sev_per_km = np.divide(sev_sum, length_km, out=np.zeros_like(sev_sum), where=length_km > 0)
+    return roads.assign(
+        n_crashes=n_crashes,
+        sev_sum=sev_sum,
+        crashes_per_km=crashes_per_km,
+        sev_per_km=sev_per_km,
+        risk_score=0.6 * sev_per_km + 0.4 * crashes_per_km,
+    )
 
 
 def run_qaqc(roads: gpd.GeoDataFrame, crashes: gpd.GeoDataFrame) -> dict:
@@ -2,10 +2,15 @@ from __future__ import annotations
 
 import os
 import sqlite3
-from flask import Flask, request, jsonify, render_template
+import threading
+
+import numpy as np
+import orjson
+from flask import Flask, g, request, jsonify, render_template
 from flask_cors import CORS
+from pyproj import Transformer
 
-from .db import DB_PATH, init_db, ingest_nyc_crashes, clear_nyc_cache
+from .db import DB_PATH, init_db, connect_readonly, ingest_nyc_crashes, clear_nyc_cache
 from .nyc import fetch_nyc_crashes_one_month, to_geodataframe, kmeans_hotspots
 
 app = Flask(__name__)
@@ -14,12 +19,57 @@ CORS(app, resources={r"/nyc/*": {"origins": "*"}})
 # NYC bbox in EPSG:3857 (approx): x[-8270000,-8205000], y[4960000,5030000]
 NYC_BBOX_3857 = (-8270000.0, -8205000.0, 4960000.0, 5030000.0)
 
+# PROJ pipeline setup is costly; build once per process and share across
+# requests (Transformer.transform is thread-safe)
+_TO_3857 = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+_TO_4326 = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
+
+
+def _json_response(obj):
+    # orjson is several times faster than Flask's stdlib-based jsonify for
+    # large FeatureCollections
+    return app.response_class(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), mimetype="application/json")
+
 
 def get_con() -> sqlite3.Connection:
-    # Ensure DB path and schema exist; safe to call repeatedly
-    con = init_db(DB_PATH)
-    con.row_factory = sqlite3.Row
-    return con
+    # Read-write connection, opened at most once per request (schema setup
+    # itself only runs once per process inside init_db)
+    if "con" not in g:
+        g.con = init_db(DB_PATH)
+        g.con.row_factory = sqlite3.Row
+    return g.con
+
+
+@app.teardown_appcontext
+def close_con(exc):
+    con = g.pop("con", None)
+    if con is not None:
+        con.close()
+
+
+_READ_CON: sqlite3.Connection | None = None
+_READ_CON_LOCK = threading.Lock()
+
+
+def get_read_con() -> sqlite3.Connection:
+    # Process-wide read-only connection shared by the query endpoints;
+    # WAL lets it read concurrently with refresh writes
+    global _READ_CON
+    if _READ_CON is None:
+        with _READ_CON_LOCK:
+            if _READ_CON is None:
+                con = connect_readonly(DB_PATH)
+                con.row_factory = sqlite3.Row
+                _READ_CON = con
+    return _READ_CON
+
+
+def _refresh_cache(limit: int) -> None:
+    df = fetch_nyc_crashes_one_month(limit=limit)
+    gdf = to_geodataframe(df)
+    con = get_con()
+    clear_nyc_cache(con)
+    ingest_nyc_crashes(con, gdf)
 
 
 ## NYC-only API
@@ -36,39 +86,33 @@ def nyc_crashes():
     hour = request.args.get("hour")
     refresh = request.args.get("refresh") == "1"
 
-    with get_con() as con:
-        if refresh:
-            df = fetch_nyc_crashes_one_month(limit=limit)
-            gdf = to_geodataframe(df)
-            clear_nyc_cache(con)
-            ingest_nyc_crashes(con, gdf)
-        # Query from cache (optionally filter by hour) and clip to NYC bbox
-        xmin, xmax, ymin, ymax = NYC_BBOX_3857
-        if hour is not None:
-            rows = con.execute(
-                """
-                SELECT c.crash_id, c.severity, c.hour, c.crash_date, c.wkt
-                FROM nyc_crashes c
-                JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id
-                WHERE c.wkt != '' AND c.hour = ?
-                  AND r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?
-                LIMIT ?
-                """,
-                (int(hour), xmax, xmin, ymax, ymin, limit),
-            ).fetchall()
-        else:
-            rows = con.execute(
-                """
-                SELECT c.crash_id, c.severity, c.hour, c.crash_date, c.wkt
-                FROM nyc_crashes c
-                JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id
-                WHERE c.wkt != ''
-                  AND r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?
-                LIMIT ?
-                """,
-                (xmax, xmin, ymax, ymin, limit),
-            ).fetchall()
-    return jsonify(_rows_to_features(rows, ["crash_id", "severity", "hour", "crash_date"]))
+    if refresh:
+        _refresh_cache(limit)
+    con = get_read_con()
+    # Query from cache (optionally filter by hour) and clip to NYC bbox
+    xmin, xmax, ymin, ymax = NYC_BBOX_3857
+    if hour is not None:
+        rows = con.execute(
+            """
+            SELECT crash_id, severity, hour, crash_date, x, y
+            FROM nyc_crashes_bbox
+            WHERE hour = ?
+              AND minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?
+            LIMIT ?
+            """,
+            (int(hour), xmax, xmin, ymax, ymin, limit),
+        ).fetchall()
+    else:
+        rows = con.execute(
+            """
+            SELECT crash_id, severity, hour, crash_date, x, y
+            FROM nyc_crashes_bbox
+            WHERE minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?
+            LIMIT ?
+            """,
+            (xmax, xmin, ymax, ymin, limit),
+        ).fetchall()
+    return _json_response(_rows_to_features(rows, ["crash_id", "severity", "hour", "crash_date"]))
 
 
 @app.get("/nyc/hotspots")
@@ -78,54 +122,83 @@ def nyc_hotspots():
     hour = request.args.get("hour")
     refresh = request.args.get("refresh") == "1"
 
-    with get_con() as con:
-        if refresh:
-            df = fetch_nyc_crashes_one_month(limit=limit)
-            gdf = to_geodataframe(df)
-            clear_nyc_cache(con)
-            ingest_nyc_crashes(con, gdf)
-        xmin, xmax, ymin, ymax = NYC_BBOX_3857
-        if hour is not None:
-            rows = con.execute(
-                """
-                SELECT c.crash_id, c.severity, c.hour, c.wkt
-                FROM nyc_crashes c
-                JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id
-                WHERE c.wkt != '' AND c.hour = ?
-                  AND r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?
-                LIMIT ?
-                """,
-                (int(hour), xmax, xmin, ymax, ymin, limit),
-            ).fetchall()
-        else:
-            rows = con.execute(
-                """
-                SELECT c.crash_id, c.severity, c.hour, c.wkt
-                FROM nyc_crashes c
-                JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id
-                WHERE c.wkt != ''
-                  AND r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?
-                LIMIT ?
-                """,
-                (xmax, xmin, ymax, ymin, limit),
-            ).fetchall()
-    # Convert rows to GDF (EPSG:3857) then compute hotspots
-    # Build a minimal GeoDataFrame from rows
-    import shapely.wkt as swkt
-    import geopandas as gpd
-    from shapely.geometry import Point
-    geoms = []
-    sev = []
-    hr = []
-    for r in rows:
-        crash_id, s, h, wkt = r
-        geom = swkt.loads(wkt) if wkt else None
-        geoms.append(geom)
-        sev.append(int(s))
-        hr.append(int(h))
-    gdf = gpd.GeoDataFrame({"severity": sev, "hour": hr}, geometry=geoms, crs="EPSG:3857")
-    hs = kmeans_hotspots(gdf.to_crs("EPSG:3857"), k=k)
-    return jsonify(_gdf_to_fc(hs))
+    if refresh:
+        _refresh_cache(limit)
+    con = get_read_con()
+    xmin, xmax, ymin, ymax = NYC_BBOX_3857
+    if hour is not None:
+        rows = con.execute(
+            """
+            SELECT severity, x, y
+            FROM nyc_crashes_bbox
+            WHERE hour = ?
+              AND minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?
+            LIMIT ?
+            """,
+            (int(hour), xmax, xmin, ymax, ymin, limit),
+        ).fetchall()
+    else:
+        rows = con.execute(
+            """
+            SELECT severity, x, y
+            FROM nyc_crashes_bbox
+            WHERE minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?
+            LIMIT ?
+            """,
+            (xmax, xmin, ymax, ymin, limit),
+        ).fetchall()
+    # Cached coordinates are already EPSG:3857; cluster them directly
+    X = np.array([(r["x"], r["y"]) for r in rows], dtype=float).reshape(-1, 2)
+    sev = np.array([r["severity"] for r in rows], dtype=float)
+    cluster, centers, n, sev_mean = kmeans_hotspots(X, sev, k=k)
+    lons, lats = _TO_4326.transform(centers[:, 0], centers[:, 1])
+    feats = [
+        {
+            "type": "Feature",
+            "properties": {"cluster": c, "n": cnt, "severity_mean": m},
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        }
+        for c, cnt, m, lon, lat in zip(cluster.tolist(), n.tolist(), sev_mean.tolist(), lons.tolist(), lats.tolist())
+    ]
+    return _json_response({"type": "FeatureCollection", "features": feats})
+
+
+def _area_filter(args) -> tuple[str, tuple]:
+    """Build an EPSG:3857 SQL predicate over ``nyc_crashes_bbox`` from query params.
+
+    The RTREE terms only prune: it stores 32-bit float bounds, which widen each
+    box by up to ~1 m at NYC Web Mercator magnitudes. Bbox mode therefore also
+    tests the exact stored x/y, and point mode applies a squared-distance test
+    on them. Raises ValueError with a client-facing message.
+    """
+    mode = args.get("mode", "bbox")
+    if mode not in ("bbox", "point"):
+        raise ValueError("invalid mode")
+    if mode == "bbox" and not args.get("bbox"):
+        raise ValueError("bbox required")
+    bbox_sql = "minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?"
+    try:
+        if mode == "bbox":
+            minlon, minlat, maxlon, maxlat = [float(v) for v in args.get("bbox").split(",")]
+            x1, y1 = _TO_3857.transform(minlon, minlat)
+            x2, y2 = _TO_3857.transform(maxlon, maxlat)
+            xmin, xmax = (min(x1, x2), max(x1, x2))
+            ymin, ymax = (min(y1, y2), max(y1, y2))
+            return (
+                bbox_sql + " AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?",
+                (xmax, xmin, ymax, ymin, xmin, xmax, ymin, ymax),
+            )
+        lon = float(args.get("lon"))
+        lat = float(args.get("lat"))
+        radius_m = float(args.get("radius_m", 250))
+        x, y = _TO_3857.transform(lon, lat)
+    except Exception:
+        raise ValueError("invalid geometry parameters")
+    return (
+        bbox_sql + " AND (x - ?) * (x - ?) + (y - ?) * (y - ?) <= ?",
+        (x + radius_m, x - radius_m, y + radius_m, y - radius_m, x, x, y, y, radius_m * radius_m),
+    )
+
 
 @app.get("/nyc/timeseries")
 def nyc_timeseries():
@@ -135,65 +208,15 @@ def nyc_timeseries():
       - mode: 'bbox' or 'point'
       - bbox: "minlon,minlat,maxlon,maxlat" (EPSG:4326) when mode=bbox
       - lon, lat: point in EPSG:4326 when mode=point
-      - radius_m: buffer radius in meters for point mode (default 250)
+      - radius_m: search radius in meters for point mode (default 250)
     """
     from datetime import datetime, timedelta, UTC
-    from shapely.geometry import box, Point
-    import shapely.wkt as swkt
-    from pyproj import Transformer
 
     mode = request.args.get("mode", "bbox")
-    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-
-    # Build filter geometry in EPSG:3857
-    geom_filter = None
-    xmin = xmax = ymin = ymax = None
     try:
-        if mode == "bbox":
-            bbox = request.args.get("bbox")
-            if not bbox:
-                return jsonify({"error": "bbox required"}), 400
-            minlon, minlat, maxlon, maxlat = [float(v) for v in bbox.split(",")]
-            x1, y1 = transformer.transform(minlon, minlat)
-            x2, y2 = transformer.transform(maxlon, maxlat)
-            xmin, xmax = (min(x1, x2), max(x1, x2))
-            ymin, ymax = (min(y1, y2), max(y1, y2))
-            from shapely.geometry import box as sbox
-            geom_filter = sbox(xmin, ymin, xmax, ymax)
-        elif mode == "point":
-            lon = float(request.args.get("lon"))
-            lat = float(request.args.get("lat"))
-            radius_m = float(request.args.get("radius_m", 250))
-            x, y = transformer.transform(lon, lat)
-            xmin, xmax = x - radius_m, x + radius_m
-            ymin, ymax = y - radius_m, y + radius_m
-            geom_filter = Point(x, y).buffer(radius_m)
-        else:
-            return jsonify({"error": "invalid mode"}), 400
-    except Exception:
-        return jsonify({"error": "invalid geometry parameters"}), 400
-
-    # Candidate rows via RTREE bbox, then precise spatial filter
-    with get_con() as con:
-        rows = con.execute(
-            """
-            SELECT c.crash_date, c.wkt
-            FROM nyc_crashes c
-            JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id
-            WHERE c.wkt != ''
-              AND r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?
-            """,
-            (xmax, xmin, ymax, ymin),
-        ).fetchall()
-
-    dates = []
-    for crash_date, wkt in rows:
-        try:
-            geom = swkt.loads(wkt)
-            if geom is not None and geom_filter.intersects(geom):
-                dates.append(crash_date)
-        except Exception:
-            continue
+        where, params = _area_filter(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # Build last 30 days date range
     today = datetime.now(UTC).date()
@@ -204,14 +227,24 @@ def nyc_timeseries():
         d = (start + timedelta(days=i)).isoformat()
         day_index[d] = i
         series.append({"date": d, "count": 0})
+
+    # Spatial filter and daily histogram both run in SQLite;
+    # crash_date is stored as string 'YYYY-MM-DD'
+    rows = get_read_con().execute(
+        f"""
+        SELECT crash_date AS d, COUNT(*) AS n
+        FROM nyc_crashes_bbox
+        WHERE {where} AND crash_date >= ?
+        GROUP BY crash_date
+        """,
+        (*params, start.isoformat()),
+    ).fetchall()
+
     total = 0
-    for d in dates:
-        if not d:
-            continue
-        # d is stored as string 'YYYY-MM-DD'
+    for d, n in rows:
         if d in day_index:
-            series[day_index[d]]["count"] += 1
-            total += 1
+            series[day_index[d]]["count"] += n
+            total += n
 
     return jsonify({
         "mode": mode,
@@ -222,75 +255,36 @@ def nyc_timeseries():
 @app.get("/nyc/summary")
 def nyc_summary():
     """Return severity histogram and summary stats within selected area for last 30 days."""
-    from shapely.geometry import Point
-    import shapely.wkt as swkt
-    from pyproj import Transformer
-
-    mode = request.args.get("mode", "bbox")
-    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-
-    # Build filter geometry in EPSG:3857
-    geom_filter = None
-    xmin = xmax = ymin = ymax = None
     try:
-        if mode == "bbox":
-            bbox = request.args.get("bbox")
-            if not bbox:
-                return jsonify({"error": "bbox required"}), 400
-            minlon, minlat, maxlon, maxlat = [float(v) for v in bbox.split(",")]
-            x1, y1 = transformer.transform(minlon, minlat)
-            x2, y2 = transformer.transform(maxlon, maxlat)
-            xmin, xmax = (min(x1, x2), max(x1, x2))
-            ymin, ymax = (min(y1, y2), max(y1, y2))
-            from shapely.geometry import box as sbox
-            geom_filter = sbox(xmin, ymin, xmax, ymax)
-        elif mode == "point":
-            lon = float(request.args.get("lon"))
-            lat = float(request.args.get("lat"))
-            radius_m = float(request.args.get("radius_m", 250))
-            x, y = transformer.transform(lon, lat)
-            xmin, xmax = x - radius_m, x + radius_m
-            ymin, ymax = y - radius_m, y + radius_m
-            geom_filter = Point(x, y).buffer(radius_m)
-        else:
-            return jsonify({"error": "invalid mode"}), 400
-    except Exception:
-        return jsonify({"error": "invalid geometry parameters"}), 400
+        where, params = _area_filter(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Spatial filter and per-severity aggregation both run in SQLite
+    rows = get_read_con().execute(
+        f"""
+        SELECT severity, COUNT(*) AS n,
+               MIN(NULLIF(crash_date, '')) AS min_d, MAX(NULLIF(crash_date, '')) AS max_d
+        FROM nyc_crashes_bbox
+        WHERE {where}
+        GROUP BY severity
+        """,
+        params,
+    ).fetchall()
 
-    # Candidate rows via RTREE bbox, then precise spatial filter
-    with get_con() as con:
-        rows = con.execute(
-            """
-            SELECT c.severity, c.crash_date, c.wkt
-            FROM nyc_crashes c
-            JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id
-            WHERE c.wkt != ''
-              AND r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?
-            """,
-            (xmax, xmin, ymax, ymin),
-        ).fetchall()
-
-    # Aggregate
     hist = {str(i): 0 for i in range(1, 6)}
     total = 0
-    dates = []
     sev_sum = 0
-    for s, d, wkt in rows:
-        try:
-            geom = swkt.loads(wkt)
-            if geom is not None and geom_filter.intersects(geom):
-                sev = int(s)
-                hist[str(sev)] = hist.get(str(sev), 0) + 1
-                sev_sum += sev
-                total += 1
-                if d:
-                    dates.append(d)
-        except Exception:
-            continue
+    for sev, n, _, _ in rows:
+        hist[str(sev)] = hist.get(str(sev), 0) + n
+        sev_sum += sev * n
+        total += n
+    mins = [r["min_d"] for r in rows if r["min_d"]]
+    maxs = [r["max_d"] for r in rows if r["max_d"]]
 
     avg_sev = (sev_sum / total) if total else 0.0
-    min_date = min(dates) if dates else None
-    max_date = max(dates) if dates else None
+    min_date = min(mins) if mins else None
+    max_date = max(maxs) if maxs else None
 
     return jsonify({
         "severity_hist": hist,
@@ -301,45 +295,23 @@ def nyc_summary():
     })
 
 def _rows_to_features(rows, prop_names):
-    import shapely.wkt as swkt
-    from shapely.geometry import mapping
-    from shapely.ops import transform
-    from pyproj import Transformer
-
-    # SQLite stores WKT in EPSG:3857; Leaflet expects EPSG:4326
-    transformer = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True).transform
-
-    feats = []
-    for row in rows:
-        *props_vals, wkt = row
-        geom_obj = swkt.loads(wkt) if wkt else None
-        geom_4326 = transform(transformer, geom_obj) if geom_obj is not None else None
-        geom = mapping(geom_4326) if geom_4326 is not None else None
-        props = {k: v for k, v in zip(prop_names, props_vals)}
-        feats.append({
-            "type": "Feature",
-            "properties": props,
-            "geometry": geom,
-        })
-    return {"type": "FeatureCollection", "features": feats}
+    if not rows:
+        return {"type": "FeatureCollection", "features": []}
 
+    # SQLite stores x/y in EPSG:3857; Leaflet expects EPSG:4326.
+    # NYC crashes are all points, so emit Point geometries straight from the
+    # reprojected coordinate arrays
+    xy = np.array([(r["x"], r["y"]) for r in rows], dtype=float)
+    lons, lats = _TO_4326.transform(xy[:, 0], xy[:, 1])
 
-def _gdf_to_fc(gdf):
-    from shapely.geometry import mapping
-    feats = []
-    if gdf is None or len(gdf) == 0:
-        return {"type": "FeatureCollection", "features": feats}
-    # Ensure WGS84 for Leaflet
-    try:
-        if getattr(gdf, "crs", None) is not None and gdf.crs.to_string() != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
-    except Exception:
-        pass
-    geom_col = gdf.geometry.name
-    for _, row in gdf.iterrows():
-        props = {k: v for k, v in row.items() if k != geom_col}
-        geom = mapping(row[geom_col]) if row[geom_col] is not None else None
-        feats.append({"type": "Feature", "properties": props, "geometry": geom})
+    feats = [
+        {
+            "type": "Feature",
+            "properties": {k: row[k] for k in prop_names},
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        }
+        for row, lon, lat in zip(rows, lons.tolist(), lats.tolist())
+    ]
     return {"type": "FeatureCollection", "features": feats}
 
 
@@ -3,13 +3,33 @@ from __future__ import annotations
 import sqlite3
 from pathlib import Path
 
+import numpy as np
+import shapely
+
 
 DB_PATH = Path("data/processed/pocket_gis.db")
 
 
-SCHEMA_SQL = """
-PRAGMA journal_mode=WAL;
+# Bump whenever the NYC cache layout changes; stale caches are rebuilt
+SCHEMA_VERSION = 2
+
+# Per-connection settings, applied on every connect
+CONNECTION_PRAGMAS = """
 PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-262144;
+PRAGMA mmap_size=268435456;
+"""
+
+RTREE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS rtree_nyc_crashes USING rtree(
+    crash_id, minx, maxx, miny, maxy
+);
+"""
+
+# One-time (persistent) database setup
+SCHEMA_SQL = f"""
+PRAGMA journal_mode=WAL;
 
 -- NYC cached crashes (last 30 days)
 CREATE TABLE IF NOT EXISTS nyc_crashes (
@@ -17,53 +37,143 @@ CREATE TABLE IF NOT EXISTS nyc_crashes (
     severity INTEGER NOT NULL,
     hour INTEGER NOT NULL,
     crash_date TEXT,
-    wkt TEXT NOT NULL
-);
-CREATE VIRTUAL TABLE IF NOT EXISTS rtree_nyc_crashes USING rtree(
-    crash_id, minx, maxx, miny, maxy
+    x REAL NOT NULL,
+    y REAL NOT NULL
 );
+CREATE INDEX IF NOT EXISTS idx_nyc_crashes_hour_xy ON nyc_crashes(hour, x, y);
+{RTREE_SQL}
+
+-- Crashes joined to their RTREE entry; bbox predicates on this view are
+-- pushed down to the RTREE by SQLite's view flattening
+CREATE VIEW IF NOT EXISTS nyc_crashes_bbox AS
+SELECT c.crash_id, c.severity, c.hour, c.crash_date, c.x, c.y,
+       r.minx, r.maxx, r.miny, r.maxy
+FROM nyc_crashes c
+JOIN rtree_nyc_crashes r ON r.crash_id = c.crash_id;
+"""
+
+DROP_SQL = """
+DROP VIEW IF EXISTS nyc_crashes_bbox;
+DROP TABLE IF EXISTS nyc_crashes;
+DROP TABLE IF EXISTS rtree_nyc_crashes;
 """
 
 
+# Database files whose schema has been checked by this process
+_SCHEMA_INITIALIZED: set[Path] = set()
+
+
 def init_db(db_path: Path = DB_PATH) -> sqlite3.Connection:
     db_path.parent.mkdir(parents=True, exist_ok=True)
     con = sqlite3.connect(db_path)
-    con.executescript(SCHEMA_SQL)
+    key = db_path.resolve()
+    if key not in _SCHEMA_INITIALIZED:
+        if con.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # NYC tables are a re-fetchable cache, so drop rather than migrate
+            con.executescript(DROP_SQL)
+        con.executescript(SCHEMA_SQL)
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        _SCHEMA_INITIALIZED.add(key)
+    con.executescript(CONNECTION_PRAGMAS)
+    return con
+
+
+def connect_readonly(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    """Open a read-only, thread-shareable connection (schema is created first if needed).
+
+    Under WAL, readers on this connection never block the writer used for refreshes.
+    """
+    init_db(db_path).close()
+    con = sqlite3.connect(
+        f"file:{db_path.resolve().as_posix()}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        isolation_level=None,
+    )
+    con.executescript(CONNECTION_PRAGMAS)
+    con.execute("PRAGMA query_only=1")
     return con
 
 
+def _zorder(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Morton (Z-order) keys for points quantized to 16 bits per axis over their extent."""
+    def quantize(v):
+        lo = v.min()
+        span = (v.max() - lo) or 1.0
+        return ((v - lo) / span * 0xFFFF).astype(np.int64)
+
+    def spread(v):
+        # Insert a zero bit between each of the 16 low bits
+        v = (v | (v << 8)) & 0x00FF00FF
+        v = (v | (v << 4)) & 0x0F0F0F0F
+        v = (v | (v << 2)) & 0x33333333
+        v = (v | (v << 1)) & 0x55555555
+        return v
+
+    return spread(quantize(x)) | (spread(quantize(y)) << 1)
+
+
 def ingest_nyc_crashes(con: sqlite3.Connection, gdf):
-    """Persist NYC crashes into SQLite with RTREE (expects GeoDataFrame-like object)."""
+    """Persist NYC crashes into SQLite with RTREE (expects GeoDataFrame-like object).
+
+    Both tables are written in one ``BEGIN IMMEDIATE`` transaction, so ``con``
+    must not have a transaction open (commit or roll back pending writes first);
+    otherwise ``sqlite3.OperationalError`` is raised and nothing is written.
+    """
     try:
         crs = getattr(gdf, "crs", None)
         gdf3857 = gdf.to_crs("EPSG:3857") if crs and gdf.crs.to_string() != "EPSG:3857" else gdf
     except Exception:
         gdf3857 = gdf
-    wkts = gdf3857.geometry.to_wkt()
-    rows = [
-        (
-            int(r[0]),  # crash_id
-            int(r[1]),  # severity
-            int(r[2]),  # hour
-            str(r[3]) if r[3] is not None else None,  # crash_date
-            w,
-        )
-        for r, w in zip(gdf3857[["crash_id", "severity", "hour", "crash_date"]].values, wkts)
-    ]
-    con.executemany(
-        "INSERT OR REPLACE INTO nyc_crashes(crash_id, severity, hour, crash_date, wkt) VALUES(?,?,?,?,?)",
-        rows,
+    ids = gdf3857["crash_id"].to_numpy(dtype="int64")
+    # NYC crashes are points: x/y double as the (degenerate) RTREE bounds.
+    # get_x/get_y keep one value per row (NaN for missing/empty geometries)
+    geoms = gdf3857.geometry.values
+    xy = np.column_stack([shapely.get_x(geoms), shapely.get_y(geoms)])
+    if np.isnan(xy).any():
+        raise ValueError("ingest_nyc_crashes requires a non-empty point geometry for every crash")
+    # Columns are converted to native Python scalars in bulk (sqlite3 cannot
+    # bind NumPy integers) and streamed to executemany without row lists
+    rows = zip(
+        ids.tolist(),
+        gdf3857["severity"].to_numpy(dtype="int64").tolist(),
+        gdf3857["hour"].to_numpy(dtype="int64").tolist(),
+        (str(d) if d is not None else None for d in gdf3857["crash_date"].to_numpy()),
+        xy[:, 0].tolist(),
+        xy[:, 1].tolist(),
     )
-    b = gdf3857.geometry.bounds
-    rtree_rows = [
-        (int(i), float(bb.minx), float(bb.maxx), float(bb.miny), float(bb.maxy))
-        for i, bb in zip(gdf3857["crash_id"], b.itertuples())
-    ]
-    con.executemany("INSERT OR REPLACE INTO rtree_nyc_crashes VALUES(?,?,?,?,?)", rtree_rows)
-    con.commit()
+    # Feed the RTREE in Z-order so spatially close entries land in the same
+    # nodes; this builds a far tighter tree than arbitrary insertion order
+    order = np.argsort(_zorder(xy[:, 0], xy[:, 1]), kind="stable") if len(xy) else np.empty(0, dtype=int)
+    rxs = xy[order, 0].tolist()
+    rys = xy[order, 1].tolist()
+    rtree_rows = zip(ids[order].tolist(), rxs, rxs, rys, rys)
+
+    # Single immediate transaction for both tables (one commit, one WAL sync)
+    # with a larger page cache while the tree is built
+    prev_cache = con.execute("PRAGMA cache_size").fetchone()[0]
+    con.execute("PRAGMA cache_size=-524288")
+    try:
+        # Fails (leaving the caller's pending transaction untouched) if one is open
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.executemany(
+                "INSERT OR REPLACE INTO nyc_crashes(crash_id, severity, hour, crash_date, x, y) VALUES(?,?,?,?,?,?)",
+                rows,
+            )
+            con.executemany("INSERT OR REPLACE INTO rtree_nyc_crashes VALUES(?,?,?,?,?)", rtree_rows)
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+    finally:
+        con.execute(f"PRAGMA cache_size={int(prev_cache)}")
 
 
 def clear_nyc_cache(con: sqlite3.Connection):
+    # Drop the RTREE instead of deleting its rows so the next ingest bulk-loads
+    # a fresh tree rather than rebalancing a stale one
     con.execute("DELETE FROM nyc_crashes")
-    con.execute("DELETE FROM rtree_nyc_crashes")
+    con.execute("DROP TABLE IF EXISTS rtree_nyc_crashes")
+    con.execute(RTREE_SQL)
     con.commit()
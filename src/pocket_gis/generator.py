@@ -6,7 +6,8 @@ from typing import Tuple
 
 import geopandas as gpd
 import numpy as np
-from shapely.geometry import LineString, Point
+import shapely
+from shapely.geometry import LineString
 from shapely.ops import unary_union
 
 
@@ -66,18 +67,18 @@ def generate_crashes(roads: gpd.GeoDataFrame, cfg: GenerationConfig) -> gpd.GeoD
     probs = lengths / lengths.sum()
     road_choice = rng.choice(len(roads), size=n, p=probs)
 
-    pts = []
-    severity = []
-    hour = []
-    for idx in road_choice:
-        line: LineString = roads.geometry.iloc[idx]
-        t = rng.random()
-        point = line.interpolate(t, normalized=True)
-        pts.append(Point(point.x + rng.normal(0, 10), point.y + rng.normal(0, 10)))
-        # Severity 1-5, skewed heavy-tail
-        sev = int(np.clip(np.round(rng.pareto(1.3) + 1), 1, 5))
-        severity.append(sev)
-        hour.append(int(rng.integers(0, 24)))
+    # Roads are 2-vertex LineStrings, so interpolation is a straight lerp
+    # between endpoints; do it for every crash in one vectorized pass.
+    ends = shapely.get_coordinates(roads.geometry.values).reshape(-1, 2, 2)
+    p0 = ends[road_choice, 0]
+    d = ends[road_choice, 1] - p0
+    t = rng.random(size=n)
+    jx = rng.normal(0, 10, size=n)
+    jy = rng.normal(0, 10, size=n)
+    pts = shapely.points(p0[:, 0] + t * d[:, 0] + jx, p0[:, 1] + t * d[:, 1] + jy)
+    # Severity 1-5, skewed heavy-tail; both attributes fit in int8
+    severity = np.clip(np.round(rng.pareto(1.3, size=n) + 1), 1, 5).astype(np.int8)
+    hour = rng.integers(0, 24, size=n, dtype=np.int8)
 
     gdf = gpd.GeoDataFrame({
         "severity": severity,
@@ -2,19 +2,68 @@ from __future__ import annotations
 
 import math
 from datetime import datetime, timedelta, UTC
+from pathlib import Path
 from typing import Tuple, List
 
 import geopandas as gpd
 import numpy as np
+import orjson
 import pandas as pd
 import requests
+import shapely
 from shapely.geometry import Point
 
+try:  # optional JIT for the k-means inner loop
+    from numba import njit
+except ImportError:
+    njit = None
+
 NYC_API = "https://data.cityofnewyork.us/resource/h9gi-nx95.json"
 
 # NYC CRS is typically EPSG:2263 (NAD83 / New York Long Island ftUS),
 # but we'll keep everything in Web Mercator (EPSG:3857) for simplicity.
 
+# Last Socrata response per (date, limit), revalidated with its ETag
+NYC_CACHE_DIR = Path("data/processed/nyc_cache")
+
+
+def _get_cached(params: dict, cache_key: str) -> list:
+    """GET ``NYC_API`` records, reusing the on-disk copy when Socrata answers 304."""
+    path = NYC_CACHE_DIR / f"{cache_key}.json"
+    cached = None
+    if path.exists():
+        try:
+            cached = orjson.loads(path.read_bytes())
+        except orjson.JSONDecodeError:
+            cached = None
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
+    r = requests.get(NYC_API, params=params, headers=headers, timeout=30)
+    if r.status_code == 304 and cached:
+        return cached["records"]
+    r.raise_for_status()
+    records = orjson.loads(r.content)
+    etag = r.headers.get("ETag")
+    if etag:
+        NYC_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Only the latest query is worth keeping
+        for old in NYC_CACHE_DIR.glob("*.json"):
+            old.unlink(missing_ok=True)
+        path.write_bytes(orjson.dumps({"etag": etag, "records": records}))
+    return records
+
+
+def _int_or_zero(v) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _hour_or_zero(t) -> int:
+    # "HH:MM" -> HH; malformed or out-of-range times map to 0 as before
+    h = _int_or_zero(t.split(":", 1)[0]) if isinstance(t, str) else 0
+    return h if 0 <= h <= 23 else 0
+
 
 def fetch_nyc_crashes_one_month(limit: int = 5000) -> pd.DataFrame:
     now = datetime.now(UTC)
@@ -33,24 +82,30 @@ def fetch_nyc_crashes_one_month(limit: int = 5000) -> pd.DataFrame:
         "$limit": str(limit),
         "$order": "crash_date DESC",
     }
-    r = requests.get(NYC_API, params=params, timeout=30)
-    r.raise_for_status()
-    df = pd.DataFrame(r.json())
+    df = pd.DataFrame(_get_cached(params, cache_key=f"{now.date()}_{limit}"))
     if df.empty:
         return df
 
-    # Normalize types
+    # Normalize types (Socrata returns every field as a string); one pass per
+    # column over the raw object array instead of pandas' coercing parsers
+    n = len(df)
+    counts = {}
     for col in ["number_of_persons_injured", "number_of_persons_killed"]:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-    # Extract hour from crash_time if present
+            counts[col] = np.fromiter((_int_or_zero(v) for v in df[col].to_numpy()), dtype=np.int16, count=n)
+            df[col] = counts[col]
+    # Extract hour from crash_time ("HH:MM") if present
     if "crash_time" in df.columns:
-        df["hour"] = pd.to_datetime(df["crash_time"], format="%H:%M", errors="coerce").dt.hour.fillna(0).astype(int)
+        df["hour"] = np.fromiter(
+            (_hour_or_zero(t) for t in df["crash_time"].to_numpy()),
+            dtype=np.int8,
+            count=n,
+        )
     else:
         df["hour"] = 0
 
     # Severity proxy: 1 + injured + 5*killed (bounded 1..5)
-    severity = 1 + df.get("number_of_persons_injured", 0) + 5 * df.get("number_of_persons_killed", 0)
+    severity = 1 + counts.get("number_of_persons_injured", 0) + 5 * counts.get("number_of_persons_killed", 0)
     df["severity"] = np.clip(severity, 1, 5)
 
     return df
@@ -71,38 +126,97 @@ def to_geodataframe(df: pd.DataFrame) -> gpd.GeoDataFrame:
     return gdf[["crash_id", "severity", "hour", "crash_date", "geometry"]]
 
 
-def kmeans_hotspots(crashes: gpd.GeoDataFrame, k: int = 20) -> gpd.GeoDataFrame:
-    if crashes.empty:
-        return gpd.GeoDataFrame(columns=["cluster", "n", "severity_mean", "geometry"], geometry="geometry", crs=crashes.crs)
-    # Simple kmeans on planar 3857 coords
-    crashes = crashes[crashes.geometry.notna()]
-    if crashes.empty:
-        return gpd.GeoDataFrame(columns=["cluster", "n", "severity_mean", "geometry"], geometry="geometry", crs=crashes.crs)
-    X = np.array([[geom.x, geom.y] for geom in crashes.geometry])
+def _kmeans_step_numpy(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """One Lloyd iteration: assign labels, then update ``centroids`` in place."""
+    K = centroids.shape[0]
+    # Assign: argmin ||x - c||^2 == argmin (||c||^2 - 2 x.c); an (N, K) gemm
+    # instead of materializing the (N, K, 2) difference array
+    d2 = (centroids ** 2).sum(axis=1)[None, :] - 2.0 * (X @ centroids.T)
+    labels = d2.argmin(axis=1)
+    # Update; empty clusters keep their previous centroid
+    counts = np.bincount(labels, minlength=K)
+    sums = np.column_stack([
+        np.bincount(labels, weights=X[:, 0], minlength=K),
+        np.bincount(labels, weights=X[:, 1], minlength=K),
+    ])
+    nonempty = counts > 0
+    centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return labels
+
+
+if njit is not None:
+
+    @njit(cache=True, fastmath=True)
+    def _kmeans_step(X, centroids):
+        """Numba version of _kmeans_step_numpy: fused assign/accumulate, no temporaries."""
+        n = X.shape[0]
+        K = centroids.shape[0]
+        labels = np.empty(n, dtype=np.int64)
+        sums = np.zeros((K, 2))
+        counts = np.zeros(K, dtype=np.int64)
+        for i in range(n):
+            best = 0
+            best_d = np.inf
+            for j in range(K):
+                dx = X[i, 0] - centroids[j, 0]
+                dy = X[i, 1] - centroids[j, 1]
+                d = dx * dx + dy * dy
+                if d < best_d:
+                    best_d = d
+                    best = j
+            labels[i] = best
+            counts[best] += 1
+            sums[best, 0] += X[i, 0]
+            sums[best, 1] += X[i, 1]
+        for j in range(K):
+            if counts[j] > 0:
+                centroids[j, 0] = sums[j, 0] / counts[j]
+                centroids[j, 1] = sums[j, 1] / counts[j]
+        return labels
+
+else:
+    _kmeans_step = _kmeans_step_numpy
+
+
+def kmeans_hotspots(
+    X: np.ndarray, severity: np.ndarray, k: int = 20
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Simple k-means on planar (N, 2) coordinates (e.g. EPSG:3857).
+
+    Returns (cluster, centers, n, severity_mean) for non-empty clusters,
+    largest first.
+    """
+    X = np.asarray(X, dtype=float).reshape(-1, 2)
+    if len(X) == 0:
+        return np.empty(0, dtype=int), np.empty((0, 2)), np.empty(0, dtype=int), np.empty(0)
+    # Center coordinates so the expanded squared-distance form in
+    # _kmeans_step_numpy stays numerically stable at Web Mercator magnitudes (~1e7 m)
+    origin = X.mean(axis=0)
+    X = X - origin
     # Initialize centroids randomly
     rng = np.random.default_rng(42)
     centroids = X[rng.choice(len(X), size=min(k, len(X)), replace=False)]
+    K = centroids.shape[0]
     for _ in range(10):
-        # Assign
-        d2 = ((X[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
-        labels = d2.argmin(axis=1)
-        # Update
-        for i in range(centroids.shape[0]):
-            pts = X[labels == i]
-            if len(pts):
-                centroids[i] = pts.mean(axis=0)
+        labels = _kmeans_step(X, centroids)
     # Build cluster stats
-    labs = labels
-    stats = []
-    geoms = []
-    for i in range(centroids.shape[0]):
-        mask = labs == i
-        n = int(mask.sum())
-        if n == 0:
-            continue
-        sev_mean = float(crashes.loc[mask, "severity"].mean())
-        stats.append((i, n, sev_mean))
-        cx, cy = centroids[i]
-        geoms.append(Point(cx, cy))
-    out = gpd.GeoDataFrame(stats, columns=["cluster", "n", "severity_mean"], geometry=geoms, crs=crashes.crs)
-    return out.sort_values("n", ascending=False).reset_index(drop=True)
+    counts = np.bincount(labels, minlength=K)
+    sev_sum = np.bincount(labels, weights=np.asarray(severity, dtype=float), minlength=K)
+    keep = np.flatnonzero(counts)
+    keep = keep[np.argsort(-counts[keep], kind="stable")]
+    return keep, centroids[keep] + origin, counts[keep], sev_sum[keep] / counts[keep]
+
+
+def kmeans_hotspots_gdf(crashes: gpd.GeoDataFrame, k: int = 20) -> gpd.GeoDataFrame:
+    """GeoDataFrame wrapper around kmeans_hotspots (columns: cluster, n, severity_mean, geometry)."""
+    crashes = crashes[crashes.geometry.notna()]
+    cluster, centers, n, sev_mean = kmeans_hotspots(
+        shapely.get_coordinates(crashes.geometry.values),
+        crashes["severity"].to_numpy(dtype=float),
+        k=k,
+    )
+    return gpd.GeoDataFrame(
+        {"cluster": cluster, "n": n, "severity_mean": sev_mean},
+        geometry=shapely.points(centers[:, 0], centers[:, 1]),
+        crs=crashes.crs,
+    )
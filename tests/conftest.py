@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timedelta, UTC
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.pocket_gis import api, nyc  # noqa: E402
+
+
+@pytest.fixture
+def socrata_records():
+    """Raw Socrata-style records (all strings) around midtown Manhattan.
+
+    Dates span 40 days so some fall outside the 30-day timeseries window.
+    """
+    rng = np.random.default_rng(7)
+    today = datetime.now(UTC).date()
+    records = []
+    for i in range(80):
+        records.append({
+            "collision_id": str(1000 + i),
+            "crash_date": f"{today - timedelta(days=int(rng.integers(0, 40)))}T00:00:00.000",
+            "crash_time": f"{int(rng.integers(0, 24))}:{int(rng.integers(0, 60)):02d}",
+            "latitude": f"{40.74 + rng.uniform(-0.02, 0.02):.6f}",
+            "longitude": f"{-73.99 + rng.uniform(-0.02, 0.02):.6f}",
+            "number_of_persons_injured": str(int(rng.integers(0, 3))),
+            "number_of_persons_killed": "1" if i % 17 == 0 else "0",
+        })
+    return records
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, socrata_records):
+    """Flask test client backed by a temporary DB, pre-loaded with ``socrata_records``."""
+    monkeypatch.setattr(api, "DB_PATH", tmp_path / "pocket_gis.db")
+    monkeypatch.setattr(api, "_READ_CON", None)
+    monkeypatch.setattr(nyc, "_get_cached", lambda params, cache_key: socrata_records)
+    c = api.app.test_client()
+    assert c.get("/nyc/crashes?refresh=1").status_code == 200
+    yield c
+    if api._READ_CON is not None:
+        api._READ_CON.close()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString
+
+from src.pocket_gis.analysis import AnalysisConfig, nearest_road, road_summary
+
+
+def _roads():
+    return gpd.GeoDataFrame(
+        {"road_id": [7, 8]},
+        geometry=[LineString([(-50, 10), (50, 10)]), LineString([(-50, -10), (50, -10)])],
+        crs="EPSG:3857",
+    )
+
+
+def test_nearest_road_left_join_and_ties():
+    crashes = gpd.GeoDataFrame(
+        {"crash_id": [1, 2, 3], "severity": [1, 2, 3], "hour": [0, 1, 2]},
+        # equidistant from both roads / near road 7 only / far outside the radius
+        geometry=gpd.points_from_xy([0, 0, 0], [0, 14, 1000]),
+        index=[10, 20, 30],
+        crs="EPSG:3857",
+    )
+    out = nearest_road(crashes, _roads(), AnalysisConfig(search_radius=80.0))
+
+    # One row per crash, even for the tie, on the crash frame's index
+    assert list(out.index) == [10, 20, 30]
+    assert out.loc[10, "road_id"] in (7, 8)
+    assert out.loc[10, "dist_m"] == 10.0
+    assert out.loc[20, "road_id"] == 7
+    assert out.loc[20, "dist_m"] == 4.0
+    assert np.isnan(out.loc[30, "road_id"]) and np.isnan(out.loc[30, "dist_m"])
+
+
+def test_road_summary_unmatched_empty_and_zero_length():
+    roads = gpd.GeoDataFrame(
+        {"road_id": [7, 8, 9], "length_m": [2000.0, 500.0, 0.0]},
+        geometry=[
+            LineString([(0, 0), (2000, 0)]),
+            LineString([(0, 10), (500, 10)]),
+            LineString([(0, 20), (0, 20)]),
+        ],
+        crs="EPSG:3857",
+    )
+    assignments = gpd.GeoDataFrame({
+        "road_id": [7.0, 7.0, np.nan, 9.0],
+        "severity": [2, 4, 5, 3],
+    })
+    out = road_summary(roads, assignments)
+
+    assert list(out["road_id"]) == [7, 8, 9]
+    # The unmatched crash (NaN road_id) is dropped
+    assert out["n_crashes"].tolist() == [2.0, 0.0, 1.0]
+    assert out["sev_sum"].tolist() == [6.0, 0.0, 3.0]
+    assert out["crashes_per_km"].tolist() == [1.0, 0.0, 0.0]
+    assert out["sev_per_km"].tolist() == [3.0, 0.0, 0.0]
+    # Road 8 has no crashes; road 9 has zero length, so both score 0
+    assert out["risk_score"].tolist() == [0.6 * 3.0 + 0.4 * 1.0, 0.0, 0.0]
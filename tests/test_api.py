@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import math
+from collections import Counter
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from pyproj import Transformer
+
+BBOX = "-74.02,40.72,-73.97,40.76"
+POINT = "lon=-73.99&lat=40.74&radius_m=800"
+
+
+@pytest.mark.parametrize("query", [f"mode=bbox&bbox={BBOX}", f"mode=point&{POINT}"])
+def test_timeseries_modes(client, query):
+    r = client.get(f"/nyc/timeseries?{query}")
+    assert r.status_code == 200, r.get_data(as_text=True)
+    body = r.get_json()
+    assert len(body["series"]) == 30
+    assert body["total"] == sum(d["count"] for d in body["series"])
+    assert body["total"] > 0
+
+
+@pytest.mark.parametrize("query", [f"mode=bbox&bbox={BBOX}", f"mode=point&{POINT}"])
+def test_summary_modes(client, query):
+    r = client.get(f"/nyc/summary?{query}")
+    assert r.status_code == 200, r.get_data(as_text=True)
+    body = r.get_json()
+    assert sorted(body["severity_hist"]) == ["1", "2", "3", "4", "5"]
+    assert body["total"] == sum(body["severity_hist"].values()) > 0
+    assert 1.0 <= body["avg_severity"] <= 5.0
+    assert body["min_date"] <= body["max_date"]
+
+
+@pytest.mark.parametrize("query,error", [
+    ("mode=bogus", "invalid mode"),
+    ("mode=bbox", "bbox required"),
+    ("mode=point&lon=abc&lat=40.7", "invalid geometry parameters"),
+])
+def test_area_filter_errors(client, query, error):
+    r = client.get(f"/nyc/summary?{query}")
+    assert r.status_code == 400
+    assert r.get_json() == {"error": error}
+
+
+def test_hotspots(client):
+    fc = client.get("/nyc/hotspots?k=5").get_json()
+    feats = fc["features"]
+    assert 0 < len(feats) <= 5
+    assert sum(f["properties"]["n"] for f in feats) == 80
+    counts = [f["properties"]["n"] for f in feats]
+    assert counts == sorted(counts, reverse=True)
+    lon, lat = feats[0]["geometry"]["coordinates"]
+    assert -74.1 < lon < -73.9 and 40.6 < lat < 40.9
+
+
+def test_hotspots_empty_hour(client):
+    # Hour 99 never occurs, so clustering runs on empty input
+    fc = client.get("/nyc/hotspots?hour=99").get_json()
+    assert fc == {"type": "FeatureCollection", "features": []}
+
+
+def _brute_force(records, inside):
+    """Expected timeseries/summary for the records whose (lon, lat) satisfy ``inside``."""
+    start = (datetime.now(UTC).date() - timedelta(days=29)).isoformat()
+    dates, sevs = [], []
+    for r in records:
+        if not inside(float(r["longitude"]), float(r["latitude"])):
+            continue
+        inj, killed = int(r["number_of_persons_injured"]), int(r["number_of_persons_killed"])
+        dates.append(r["crash_date"][:10])
+        sevs.append(min(max(1 + inj + 5 * killed, 1), 5))
+    per_day = Counter(d for d in dates if d >= start)
+    hist = Counter(sevs)
+    return {
+        "series": per_day,
+        "total_30d": sum(per_day.values()),
+        "severity_hist": {str(i): hist.get(i, 0) for i in range(1, 6)},
+        "total": len(sevs),
+        "min_date": min(dates),
+        "max_date": max(dates),
+    }
+
+
+def _check_against(client, query, expected):
+    ts = client.get(f"/nyc/timeseries?{query}").get_json()
+    assert {d["date"]: d["count"] for d in ts["series"] if d["count"]} == dict(expected["series"])
+    assert ts["total"] == expected["total_30d"]
+
+    summary = client.get(f"/nyc/summary?{query}").get_json()
+    for key in ("severity_hist", "total", "min_date", "max_date"):
+        assert summary[key] == expected[key], key
+
+
+def test_bbox_counts_match_brute_force(client, socrata_records):
+    minlon, minlat, maxlon, maxlat = -74.00, 40.73, -73.98, 40.75
+    expected = _brute_force(
+        socrata_records, lambda lon, lat: minlon <= lon <= maxlon and minlat <= lat <= maxlat
+    )
+    assert 0 < expected["total"] < len(socrata_records)
+    _check_against(client, f"mode=bbox&bbox={minlon},{minlat},{maxlon},{maxlat}", expected)
+
+
+def test_point_counts_match_brute_force(client, socrata_records):
+    to_3857 = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+    cx, cy = to_3857.transform(-73.99, 40.74)
+    radius = 800.0
+
+    def inside(lon, lat):
+        x, y = to_3857.transform(lon, lat)
+        return math.hypot(x - cx, y - cy) <= radius
+
+    expected = _brute_force(socrata_records, inside)
+    assert 0 < expected["total"] < len(socrata_records)
+    _check_against(client, f"mode=point&{POINT}", expected)
+
+
+def test_bbox_excludes_crash_just_outside_edge(tmp_path, monkeypatch):
+    import geopandas as gpd
+
+    from src.pocket_gis import api
+    from src.pocket_gis.db import init_db, ingest_nyc_crashes
+
+    monkeypatch.setattr(api, "DB_PATH", tmp_path / "edge.db")
+    monkeypatch.setattr(api, "_READ_CON", None)
+    # The RTREE rounds this x outward to a float32 box that reaches past -8235000.6
+    x, y = -8235000.9, 4975000.0
+    crashes = gpd.GeoDataFrame(
+        {"crash_id": [1], "severity": [1], "hour": [0], "crash_date": ["2024-01-01"]},
+        geometry=gpd.points_from_xy([x], [y]),
+        crs="EPSG:3857",
+    )
+    con = init_db(api.DB_PATH)
+    ingest_nyc_crashes(con, crashes)
+    con.close()
+
+    to_4326 = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
+    minlon, minlat = to_4326.transform(x + 0.3, y - 100)
+    maxlon, maxlat = to_4326.transform(x + 100, y + 100)
+    try:
+        body = api.app.test_client().get(
+            f"/nyc/summary?mode=bbox&bbox={minlon!r},{minlat!r},{maxlon!r},{maxlat!r}"
+        ).get_json()
+        assert body["total"] == 0
+    finally:
+        api._READ_CON.close()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from src.pocket_gis import api, nyc
+from src.pocket_gis.db import init_db, ingest_nyc_crashes
+
+
+def _read_count():
+    return api.get_read_con().execute("SELECT COUNT(*) FROM nyc_crashes_bbox").fetchone()[0]
+
+
+def test_refresh_twice_with_shared_read_connection(client, socrata_records):
+    # The client fixture already refreshed once and opened the read connection
+    read_con = api.get_read_con()
+    assert _read_count() == len(socrata_records)
+
+    for _ in range(2):
+        r = client.get("/nyc/crashes?refresh=1&limit=1000")
+        assert r.status_code == 200
+        assert len(r.get_json()["features"]) == len(socrata_records)
+        # Same process-wide connection sees the rebuilt RTREE after each refresh
+        assert api.get_read_con() is read_con
+        assert _read_count() == len(socrata_records)
+        assert client.get("/nyc/summary?mode=bbox&bbox=-74.1,40.6,-73.8,40.9").get_json()["total"] == len(
+            socrata_records
+        )
+
+
+def test_ingest_rejects_pending_transaction(tmp_path, monkeypatch, socrata_records):
+    monkeypatch.setattr(nyc, "_get_cached", lambda params, cache_key: socrata_records)
+    gdf = nyc.to_geodataframe(nyc.fetch_nyc_crashes_one_month())
+    con = init_db(tmp_path / "pending.db")
+    cache_size = con.execute("PRAGMA cache_size").fetchone()[0]
+    # An uncommitted DML statement leaves an implicit transaction open
+    con.execute("INSERT INTO nyc_crashes(crash_id, severity, hour, crash_date, x, y) VALUES(1, 1, 0, NULL, 0, 0)")
+    assert con.in_transaction
+
+    with pytest.raises(sqlite3.OperationalError):
+        ingest_nyc_crashes(con, gdf)
+
+    # The caller's transaction is left for them to resolve, and settings are restored
+    assert con.in_transaction
+    assert con.execute("PRAGMA cache_size").fetchone()[0] == cache_size
+    con.rollback()
+
+    ingest_nyc_crashes(con, gdf)
+    assert con.execute("SELECT COUNT(*) FROM nyc_crashes").fetchone()[0] == len(socrata_records)
+    con.close()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import geopandas as gpd
+import numpy as np
+import orjson
+import pytest
+import requests
+
+from src.pocket_gis import nyc
+from src.pocket_gis.nyc import kmeans_hotspots, kmeans_hotspots_gdf
+
+
+def test_kmeans_hotspots_arrays():
+    rng = np.random.default_rng(0)
+    centers = np.array([[0.0, 0.0], [5000.0, 5000.0]])
+    X = np.vstack([c + rng.normal(0, 50, size=(n, 2)) for c, n in zip(centers, (30, 20))]) + [-8.23e6, 4.97e6]
+    sev = np.r_[np.full(30, 1.0), np.full(20, 3.0)]
+    cluster, cen, n, sev_mean = kmeans_hotspots(X, sev, k=2)
+    assert n.tolist() == [30, 20]
+    assert np.allclose(sev_mean, [1.0, 3.0])
+    assert np.allclose(cen - [-8.23e6, 4.97e6], centers, atol=50)
+    assert sorted(cluster.tolist()) == [0, 1]
+
+
+def test_kmeans_hotspots_empty():
+    cluster, cen, n, sev_mean = kmeans_hotspots(np.empty((0, 2)), np.empty(0))
+    assert cluster.shape == n.shape == sev_mean.shape == (0,)
+    assert cen.shape == (0, 2)
+
+
+def test_kmeans_hotspots_gdf():
+    crashes = gpd.GeoDataFrame(
+        {"severity": [1, 2, 3, 4]},
+        geometry=gpd.points_from_xy([0, 1, 100, 101], [0, 1, 100, 101]),
+        crs="EPSG:3857",
+    )
+    hs = kmeans_hotspots_gdf(crashes, k=2)
+    assert list(hs.columns) == ["cluster", "n", "severity_mean", "geometry"]
+    assert hs["n"].tolist() == [2, 2]
+    assert sorted(hs["severity_mean"].tolist()) == [1.5, 3.5]
+    assert hs.crs == crashes.crs
+
+
+def test_kmeans_hotspots_gdf_empty():
+    crashes = gpd.GeoDataFrame({"severity": []}, geometry=gpd.GeoSeries([], crs="EPSG:3857"))
+    hs = kmeans_hotspots_gdf(crashes)
+    assert hs.empty
+    assert list(hs.columns) == ["cluster", "n", "severity_mean", "geometry"]
+
+
+class _Response:
+    def __init__(self, status_code, content=b"", etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+def test_get_cached_etag_roundtrip(tmp_path, monkeypatch, socrata_records):
+    monkeypatch.setattr(nyc, "NYC_CACHE_DIR", tmp_path)
+    responses = [_Response(200, orjson.dumps(socrata_records), etag='"v1"'), _Response(304)]
+    sent_headers = []
+
+    def fake_get(url, params=None, headers=None, timeout=None):
+        sent_headers.append(headers)
+        return responses.pop(0)
+
+    monkeypatch.setattr(nyc.requests, "get", fake_get)
+
+    # 200: records returned and written to the cache as JSON
+    assert nyc._get_cached({}, cache_key="k") == socrata_records
+    cached = orjson.loads((tmp_path / "k.json").read_bytes())
+    assert cached == {"etag": '"v1"', "records": socrata_records}
+
+    # 304: revalidated with the stored ETag, cached records returned
+    assert nyc._get_cached({}, cache_key="k") == socrata_records
+    assert sent_headers == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_numba_kmeans_step_matches_numpy():
+    pytest.importorskip("numba")
+    assert nyc._kmeans_step is not nyc._kmeans_step_numpy
+    rng = np.random.default_rng(3)
+    X = rng.normal(0, 1000, size=(500, 2))
+    c_numba = X[rng.choice(len(X), size=8, replace=False)].copy()
+    c_numpy = c_numba.copy()
+    for _ in range(10):
+        labels_numba = nyc._kmeans_step(X, c_numba)
+        labels_numpy = nyc._kmeans_step_numpy(X, c_numpy)
+        assert np.array_equal(labels_numba, labels_numpy)
+        assert np.allclose(c_numba, c_numpy)